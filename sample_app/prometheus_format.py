@@ -0,0 +1,267 @@
+"""
+Prometheus text rendering for the OpenAgent test metrics server
+
+Holds the formatting core used by simple_metrics_server: static headers,
+per-metric templates, Azure section caching and the output buffer. The module
+is plain typed Python so it can be compiled in place with mypyc:
+
+    pip install mypy
+    mypyc prometheus_format.py
+
+Python picks up the compiled extension automatically when it is present next
+to this file and falls back to the source otherwise.
+"""
+
+import functools
+import io
+import random
+import re
+import time
+from typing import Callable, Optional, Tuple
+
+# Cached series prefix paired with the function that renders its sample value
+Section = Tuple[bytes, Callable[[float], str]]
+# Azure metric sections plus the scrape duration/success prefixes
+StaticSections = Tuple[Tuple[Section, ...], bytes, bytes]
+
+# Global metrics for simulated data
+server_start_time = int(time.time())
+
+# Shared generator for simulated sample values
+rng = random.Random()
+
+# Static HELP/TYPE headers, encoded once at import
+UP_HEADER = b"# HELP up Server status (1=up, 0=down)\n# TYPE up gauge\n"
+SERVER_START_TIME_HEADER = b"# HELP server_start_time Server start timestamp\n# TYPE server_start_time gauge\n"
+SYSTEM_CPU_USAGE_HEADER = b"# HELP system_cpu_usage CPU usage percentage\n# TYPE system_cpu_usage gauge\n"
+SYSTEM_MEMORY_USED_HEADER = b"# HELP system_memory_used_bytes Memory usage in bytes\n# TYPE system_memory_used_bytes gauge\n"
+HTTP_REQUESTS_TOTAL_HEADER = b"# HELP http_requests_total HTTP requests counter\n# TYPE http_requests_total counter\n"
+
+# Dynamic sample lines for the always-present metrics
+UP_TMPL = "up 1 %d\n\n"
+SERVER_START_TIME_TMPL = "server_start_time %d %d\n\n"
+SYSTEM_CPU_USAGE_TMPL = "system_cpu_usage %.2f %d\n\n"
+SYSTEM_MEMORY_USED_TMPL = "system_memory_used_bytes %d %d\n\n"
+HTTP_REQUESTS_TOTAL_TMPL = (
+    'http_requests_total{method="GET",status="200"} %d %d\n'
+    'http_requests_total{method="POST",status="200"} %d %d\n'
+    'http_requests_total{method="GET",status="404"} %d %d\n\n'
+)
+
+# Comma-separated metric names, trimmed of surrounding whitespace
+METRIC_SPLIT_RE = re.compile(r"[^,\s](?:[^,]*[^,\s])?").findall
+
+# Azure resource provider path -> resource_type label, checked in order
+RESOURCE_MAP = (
+    ("Microsoft.Sql/managedInstances", "sql_managed_instance"),
+    ("Microsoft.Compute/virtualMachines", "virtual_machine"),
+    ("Microsoft.Storage/storageAccounts", "storage_account"),
+)
+
+# Escapes for Prometheus label values
+LABEL_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+
+# Escapes for HELP text, where quotes are left as-is
+HELP_ESCAPES = str.maketrans({"\\": "\\\\", "\n": "\\n"})
+
+# Label sets shared by every Azure series; metric_name, when present, sits between them
+SCOPE_LABELS_TMPL = 'subscription="{sub}",resource_type="{rt}"'.format
+WINDOW_LABELS_TMPL = 'aggregation="{agg}",interval="{iv}"'.format
+
+# Azure metric series prefixes (HELP, TYPE and labelled series name), one per metric kind
+AZURE_SQL_CPU_TMPL = (
+    "# HELP azure_sql_avg_cpu_percent Average CPU percentage from Azure API\n"
+    "# TYPE azure_sql_avg_cpu_percent gauge\n"
+    'azure_sql_avg_cpu_percent{{{scope},{window}}} '
+)
+AZURE_SQL_VCORE_TMPL = (
+    "# HELP azure_sql_virtual_core_count Virtual core count from Azure API\n"
+    "# TYPE azure_sql_virtual_core_count gauge\n"
+    'azure_sql_virtual_core_count{{{scope},{window}}} '
+)
+AZURE_SQL_MEMORY_TMPL = (
+    "# HELP azure_sql_memory_usage_percent Memory usage percentage from Azure API\n"
+    "# TYPE azure_sql_memory_usage_percent gauge\n"
+    'azure_sql_memory_usage_percent{{{scope},{window}}} '
+)
+AZURE_VM_CPU_TMPL = (
+    "# HELP azure_vm_cpu_percent {name} from Azure API\n"
+    "# TYPE azure_vm_cpu_percent gauge\n"
+    'azure_vm_cpu_percent{{{scope},metric_name="{label_name}",{window}}} '
+)
+AZURE_UNKNOWN_TMPL = (
+    "# HELP azure_unknown_metric Unknown metric {name} from Azure API\n"
+    "# TYPE azure_unknown_metric gauge\n"
+    'azure_unknown_metric{{{scope},metric_name="{label_name}",{window}}} '
+)
+SCRAPE_DURATION_TMPL = (
+    "# HELP azure_exporter_scrape_duration_seconds Time spent scraping Azure API\n"
+    "# TYPE azure_exporter_scrape_duration_seconds gauge\n"
+    'azure_exporter_scrape_duration_seconds{{subscription="{sub}"}} '
+)
+SCRAPE_SUCCESS_TMPL = (
+    "# HELP azure_exporter_scrape_success Whether the Azure API scrape was successful\n"
+    "# TYPE azure_exporter_scrape_success gauge\n"
+    'azure_exporter_scrape_success{{subscription="{sub}"}} 1 '
+)
+
+# Value and timestamp that complete a cached series prefix
+SAMPLE_TMPL = "%s %d\n\n"
+SCRAPE_DURATION_SAMPLE_TMPL = "%.3f %d\n\n"
+SCRAPE_SUCCESS_SAMPLE_TMPL = "%d\n\n"
+
+# Parameter sets beyond these limits are rendered without touching the section cache.
+# Label values repeat in every series prefix, so together they bound a cache entry
+# to roughly MAX_CACHED_METRICS * MAX_CACHED_PARAM_LEN bytes.
+MAX_CACHED_PARAM_LEN = 1024
+MAX_CACHED_METRICS = 32
+
+def sql_cpu_value(sample: float) -> str:
+    """Scale a unit sample to the SQL CPU percentage range"""
+    return "%.2f" % (20.0 + 60.0 * sample)
+
+def sql_vcore_value(sample: float) -> str:
+    """Scale a unit sample to a virtual core count (2-16)"""
+    return str(2 + int(sample * 15))
+
+def sql_memory_value(sample: float) -> str:
+    """Scale a unit sample to the SQL memory percentage range"""
+    return "%.2f" % (40.0 + 45.0 * sample)
+
+def vm_cpu_value(sample: float) -> str:
+    """Scale a unit sample to the VM CPU percentage range"""
+    return "%.2f" % (15.0 + 60.0 * sample)
+
+def unknown_value(sample: float) -> str:
+    """Scale a unit sample to 0-100"""
+    return "%.2f" % (100.0 * sample)
+
+def escape_label(value: Optional[str]) -> str:
+    """Escape a label value for the text exposition format"""
+    return str(value).translate(LABEL_ESCAPES)
+
+def escape_help(text: str) -> str:
+    """Escape HELP text for the text exposition format"""
+    return text.translate(HELP_ESCAPES)
+
+def render_cpu(metric_name: str, scope: str, window: str) -> Section:
+    """Render azure_sql_avg_cpu_percent"""
+    return AZURE_SQL_CPU_TMPL.format(scope=scope, window=window).encode(), sql_cpu_value
+
+def render_vcores(metric_name: str, scope: str, window: str) -> Section:
+    """Render azure_sql_virtual_core_count"""
+    return AZURE_SQL_VCORE_TMPL.format(scope=scope, window=window).encode(), sql_vcore_value
+
+def render_mem(metric_name: str, scope: str, window: str) -> Section:
+    """Render azure_sql_memory_usage_percent"""
+    return AZURE_SQL_MEMORY_TMPL.format(scope=scope, window=window).encode(), sql_memory_value
+
+def render_generic_or_cpu(metric_name: str, scope: str, window: str) -> Section:
+    """Render metrics without a dedicated handler (VM CPU or unknown)"""
+    label_name = escape_label(metric_name)
+    help_name = escape_help(metric_name)
+    if "CPU" in metric_name or "cpu" in metric_name.lower():
+        # Generic CPU metrics for VMs
+        prefix = AZURE_VM_CPU_TMPL.format(name=help_name, scope=scope, label_name=label_name, window=window)
+        return prefix.encode(), vm_cpu_value
+    # Generic unknown metrics
+    prefix = AZURE_UNKNOWN_TMPL.format(name=help_name, scope=scope, label_name=label_name, window=window)
+    return prefix.encode(), unknown_value
+
+# Metric name -> section renderer; names not listed fall back to render_generic_or_cpu
+HANDLERS = {
+    "avg_cpu_percent": render_cpu,
+    "virtual_core_count": render_vcores,
+    "memory_usage_percent": render_mem,
+}
+
+def build_static_sections(subscription: str, target: str, metric: str,
+                          interval: Optional[str], aggregation: Optional[str]) -> StaticSections:
+    """Render everything in the Azure block that does not change between scrapes"""
+    
+    # Extract resource type from target (similar to Azure resource paths)
+    resource_type = "unknown"
+    for needle, mapped_type in RESOURCE_MAP:
+        if needle in target:
+            resource_type = mapped_type
+            break
+    
+    # Render the shared label sets once for every series in this request
+    sub = escape_label(subscription)
+    scope = SCOPE_LABELS_TMPL(sub=sub, rt=resource_type)
+    window = WINDOW_LABELS_TMPL(agg=escape_label(aggregation), iv=escape_label(interval))
+    
+    sections = tuple(
+        HANDLERS.get(metric_name, render_generic_or_cpu)(metric_name, scope, window)
+        for metric_name in METRIC_SPLIT_RE(metric)
+    )
+    duration_prefix = SCRAPE_DURATION_TMPL.format(sub=sub).encode()
+    success_prefix = SCRAPE_SUCCESS_TMPL.format(sub=sub).encode()
+    return sections, duration_prefix, success_prefix
+
+cached_static_sections = functools.lru_cache(maxsize=1024)(build_static_sections)
+
+def is_cacheable(subscription: str, target: str, metric: str,
+                 interval: Optional[str], aggregation: Optional[str]) -> bool:
+    """Whether a parameter set is small enough to keep in the section cache"""
+    param_len = (len(subscription) + len(target) + len(metric)
+                 + len(interval or "") + len(aggregation or ""))
+    return param_len <= MAX_CACHED_PARAM_LEN and metric.count(",") < MAX_CACHED_METRICS
+
+def generate_prometheus_metrics(out: io.BytesIO,
+                               subscription: Optional[str] = None, 
+                               target: Optional[str] = None,
+                               metric: Optional[str] = None,
+                               interval: Optional[str] = None,
+                               aggregation: Optional[str] = None) -> None:
+    """Write Prometheus-format metrics based on parameters into out"""
+    
+    timestamp = int(time.time())
+    sample = rng.random
+    
+    # Add help and type headers
+    out.write(UP_HEADER)
+    out.write((UP_TMPL % timestamp).encode())
+    out.write(SERVER_START_TIME_HEADER)
+    out.write((SERVER_START_TIME_TMPL % (server_start_time, timestamp)).encode())
+    
+    # Basic system metrics (always included)
+    out.write(SYSTEM_CPU_USAGE_HEADER)
+    out.write((SYSTEM_CPU_USAGE_TMPL % (10.0 + 80.0 * sample(), timestamp)).encode())
+    out.write(SYSTEM_MEMORY_USED_HEADER)
+    out.write((SYSTEM_MEMORY_USED_TMPL % (1000000000 + int(sample() * 7000000001), timestamp)).encode())
+    out.write(HTTP_REQUESTS_TOTAL_HEADER)
+    out.write((HTTP_REQUESTS_TOTAL_TMPL % (
+        100 + int(sample() * 901), timestamp,
+        50 + int(sample() * 451), timestamp,
+        1 + int(sample() * 50), timestamp
+    )).encode())
+    
+    # Parameter-based metrics (simulating Azure exporter behavior)
+    if subscription and target and metric:
+        if is_cacheable(subscription, target, metric, interval, aggregation):
+            sections, duration_prefix, success_prefix = cached_static_sections(
+                subscription, target, metric, interval, aggregation)
+        else:
+            sections, duration_prefix, success_prefix = build_static_sections(
+                subscription, target, metric, interval, aggregation)
+        
+        for prefix, value in sections:
+            out.write(prefix)
+            out.write((SAMPLE_TMPL % (value(sample()), timestamp)).encode())
+        
+        # Add exporter metadata
+        out.write(duration_prefix)
+        out.write((SCRAPE_DURATION_SAMPLE_TMPL % (0.1 + 1.9 * sample(), timestamp)).encode())
+        out.write(success_prefix)
+        out.write((SCRAPE_SUCCESS_SAMPLE_TMPL % timestamp).encode())
+
+def render_metrics(subscription: Optional[str] = None,
+                   target: Optional[str] = None,
+                   metric: Optional[str] = None,
+                   interval: Optional[str] = None,
+                   aggregation: Optional[str] = None) -> bytes:
+    """Render metrics into a fresh buffer and return the encoded payload"""
+    buf = io.BytesIO()
+    generate_prometheus_metrics(buf, subscription, target, metric, interval, aggregation)
+    return buf.getvalue()
@@ -6,137 +6,48 @@ This FastAPI application simulates azure-metrics-exporter functionality
 to test OpenAgent's URL parameter support as specified in the PRD.
 
 Based on: /Users/jaeyoung/work/go_project/openagent/prd/cloud_monitoring_prd.md
+
+Requirements: fastapi, uvicorn, uvloop, httptools, orjson
+    pip install fastapi "uvicorn[standard]" orjson
 """
 
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import PlainTextResponse
+from fastapi import Depends, FastAPI, Query, Request
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, Response
+import logging
+import orjson
+import os
 import time
-import random
 import uvicorn
-from typing import Optional, List
+from typing import NamedTuple, Optional
+
+from prometheus_format import escape_label, render_metrics
 
 app = FastAPI(
     title="OpenAgent Test Metrics Server",
     description="FastAPI server that simulates azure-metrics-exporter for OpenAgent parameter testing",
-    version="1.0.0"
+    version="1.0.0",
+    # Metrics-only probe: no interactive docs or OpenAPI schema
+    docs_url=None,
+    redoc_url=None,
+    openapi_url=None
 )
 
-# Global metrics for simulated data
-server_start_time = int(time.time())
+# Compress larger exposition payloads for clients that send Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
-def generate_prometheus_metrics(subscription: Optional[str] = None, 
-                               target: Optional[str] = None,
-                               metric: Optional[str] = None,
-                               interval: Optional[str] = None,
-                               aggregation: Optional[str] = None) -> str:
-    """Generate Prometheus-format metrics based on parameters"""
-    
-    timestamp = int(time.time())
-    metrics_lines = []
-    
-    # Add help and type headers
-    metrics_lines.extend([
-        "# HELP up Server status (1=up, 0=down)",
-        "# TYPE up gauge",
-        f"up 1 {timestamp}",
-        "",
-        "# HELP server_start_time Server start timestamp",
-        "# TYPE server_start_time gauge", 
-        f"server_start_time {server_start_time} {timestamp}",
-        ""
-    ])
-    
-    # Basic system metrics (always included)
-    metrics_lines.extend([
-        "# HELP system_cpu_usage CPU usage percentage",
-        "# TYPE system_cpu_usage gauge",
-        f"system_cpu_usage {random.uniform(10.0, 90.0):.2f} {timestamp}",
-        "",
-        "# HELP system_memory_used_bytes Memory usage in bytes", 
-        "# TYPE system_memory_used_bytes gauge",
-        f"system_memory_used_bytes {random.randint(1000000000, 8000000000)} {timestamp}",
-        "",
-        "# HELP http_requests_total HTTP requests counter",
-        "# TYPE http_requests_total counter",
-        f'http_requests_total{{method="GET",status="200"}} {random.randint(100, 1000)} {timestamp}',
-        f'http_requests_total{{method="POST",status="200"}} {random.randint(50, 500)} {timestamp}',
-        f'http_requests_total{{method="GET",status="404"}} {random.randint(1, 50)} {timestamp}',
-        ""
-    ])
-    
-    # Parameter-based metrics (simulating Azure exporter behavior)
-    if subscription and target and metric:
-        # Extract resource type from target (similar to Azure resource paths)
-        resource_type = "unknown"
-        if "Microsoft.Sql/managedInstances" in target:
-            resource_type = "sql_managed_instance"
-        elif "Microsoft.Compute/virtualMachines" in target:
-            resource_type = "virtual_machine"
-        elif "Microsoft.Storage/storageAccounts" in target:
-            resource_type = "storage_account"
-        
-        # Process multiple metrics
-        metric_names = metric.split(",") if metric else []
-        
-        for metric_name in metric_names:
-            metric_name = metric_name.strip()
-            
-            if metric_name == "avg_cpu_percent":
-                metrics_lines.extend([
-                    "# HELP azure_sql_avg_cpu_percent Average CPU percentage from Azure API",
-                    "# TYPE azure_sql_avg_cpu_percent gauge",
-                    f'azure_sql_avg_cpu_percent{{subscription="{subscription}",resource_type="{resource_type}",aggregation="{aggregation}",interval="{interval}"}} {random.uniform(20.0, 80.0):.2f} {timestamp}',
-                    ""
-                ])
-            elif metric_name == "virtual_core_count":
-                metrics_lines.extend([
-                    "# HELP azure_sql_virtual_core_count Virtual core count from Azure API",
-                    "# TYPE azure_sql_virtual_core_count gauge", 
-                    f'azure_sql_virtual_core_count{{subscription="{subscription}",resource_type="{resource_type}",aggregation="{aggregation}",interval="{interval}"}} {random.randint(2, 16)} {timestamp}',
-                    ""
-                ])
-            elif metric_name == "memory_usage_percent":
-                metrics_lines.extend([
-                    "# HELP azure_sql_memory_usage_percent Memory usage percentage from Azure API",
-                    "# TYPE azure_sql_memory_usage_percent gauge",
-                    f'azure_sql_memory_usage_percent{{subscription="{subscription}",resource_type="{resource_type}",aggregation="{aggregation}",interval="{interval}"}} {random.uniform(40.0, 85.0):.2f} {timestamp}',
-                    ""
-                ])
-            elif "CPU" in metric_name or "cpu" in metric_name.lower():
-                # Generic CPU metrics for VMs
-                metrics_lines.extend([
-                    f"# HELP azure_vm_cpu_percent {metric_name} from Azure API",
-                    f"# TYPE azure_vm_cpu_percent gauge",
-                    f'azure_vm_cpu_percent{{subscription="{subscription}",resource_type="{resource_type}",metric_name="{metric_name}",aggregation="{aggregation}",interval="{interval}"}} {random.uniform(15.0, 75.0):.2f} {timestamp}',
-                    ""
-                ])
-            else:
-                # Generic unknown metrics
-                metrics_lines.extend([
-                    f"# HELP azure_unknown_metric Unknown metric {metric_name} from Azure API",
-                    f"# TYPE azure_unknown_metric gauge",
-                    f'azure_unknown_metric{{subscription="{subscription}",resource_type="{resource_type}",metric_name="{metric_name}",aggregation="{aggregation}",interval="{interval}"}} {random.uniform(0, 100):.2f} {timestamp}',
-                    ""
-                ])
-        
-        # Add exporter metadata
-        metrics_lines.extend([
-            "# HELP azure_exporter_scrape_duration_seconds Time spent scraping Azure API",
-            "# TYPE azure_exporter_scrape_duration_seconds gauge",
-            f'azure_exporter_scrape_duration_seconds{{subscription="{subscription}"}} {random.uniform(0.1, 2.0):.3f} {timestamp}',
-            "",
-            "# HELP azure_exporter_scrape_success Whether the Azure API scrape was successful",
-            "# TYPE azure_exporter_scrape_success gauge",
-            f'azure_exporter_scrape_success{{subscription="{subscription}"}} 1 {timestamp}',
-            ""
-        ])
-    
-    return "\n".join(metrics_lines)
+logger = logging.getLogger(__name__)
 
-@app.get("/", response_class=PlainTextResponse)
-async def root():
-    """Welcome message"""
-    return """OpenAgent Test Metrics Server (FastAPI)
+# Prometheus text exposition content type
+METRICS_MEDIA_TYPE = "text/plain; charset=utf-8"
+
+# Azure-style endpoint whose required parameters are validated by require_azure_params
+AZURE_METRICS_PATH = "/probe/metrics/resource"
+
+# Welcome message served from /
+ROOT_BYTES = b"""OpenAgent Test Metrics Server (FastAPI)
 
 This server simulates azure-metrics-exporter functionality for testing OpenAgent's URL parameter support.
 
@@ -150,21 +61,82 @@ Example with parameters:
 /probe/metrics/resource?subscription=test-sub&target=Microsoft.Sql/test&metric=avg_cpu_percent,virtual_core_count&interval=PT1M&aggregation=average
 """
 
+# Error body returned when required Azure parameters are missing
+ERROR_RESPONSE_TMPL = (
+    "# HELP azure_exporter_error Error in Azure exporter\n"
+    "# TYPE azure_exporter_error gauge\n"
+    'azure_exporter_error{{reason="missing_required_parameters",subscription="{subscription}",target_provided="{target_provided}",metric_provided="{metric_provided}"}} 1 {timestamp}\n\n'
+    "# HELP azure_exporter_request_info Information about the request\n"
+    "# TYPE azure_exporter_request_info gauge  \n"
+    'azure_exporter_request_info{{subscription="{subscription_info}",has_target="{target_provided}",has_metric="{metric_provided}",interval="{interval}",aggregation="{aggregation}"}} 0 {timestamp}\n'
+).format
+
+@app.get("/", response_class=Response)
+async def root():
+    """Welcome message"""
+    return Response(content=ROOT_BYTES, media_type="text/plain")
+
 @app.get("/health", response_class=PlainTextResponse)
 async def health():
     """Health check endpoint"""
     return "OK"
 
-@app.get("/metrics", response_class=PlainTextResponse)
+@app.get("/metrics", response_class=Response)
 async def metrics():
     """Standard Prometheus metrics endpoint (no parameters required)"""
-    return generate_prometheus_metrics()
-
-@app.get("/probe/metrics/resource", response_class=PlainTextResponse) 
+    body = render_metrics()
+    return Response(content=body, media_type=METRICS_MEDIA_TYPE)
+
+def log_azure_request(subscription: Optional[str], target: Optional[str], metric: Optional[str],
+                      interval: Optional[str], aggregation: Optional[str]) -> None:
+    """Log the request for debugging"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Request received - subscription: %s, target: %s, metric: %s, interval: %s, aggregation: %s",
+                     subscription, target, metric, interval, aggregation)
+
+class AzureParams(NamedTuple):
+    """Required Azure query parameters, validated as non-empty"""
+    subscription: str
+    target: str
+    metric: str
+
+def require_azure_params(
+    subscription: str = Query(..., min_length=1, description="Azure subscription ID"),
+    target: str = Query(..., min_length=1, description="Azure resource target path"),
+    metric: str = Query(..., min_length=1, description="Comma-separated metric names")
+) -> AzureParams:
+    """Dependency that rejects Azure requests missing subscription, target or metric"""
+    return AzureParams(subscription, target, metric)
+
+@app.exception_handler(RequestValidationError)
+async def missing_params_handler(request: Request, exc: RequestValidationError):
+    """Answer Azure requests with missing parameters in exposition format"""
+    if request.url.path != AZURE_METRICS_PATH:
+        return await request_validation_exception_handler(request, exc)
+    
+    query = request.query_params
+    subscription = query.get("subscription")
+    target = query.get("target")
+    metric = query.get("metric")
+    interval = query.get("interval", "PT1M")
+    aggregation = query.get("aggregation", "average")
+    
+    log_azure_request(subscription, target, metric, interval, aggregation)
+    
+    error_response = ERROR_RESPONSE_TMPL(
+        subscription=escape_label(subscription or "missing"),
+        subscription_info=escape_label(subscription or "none"),
+        target_provided=bool(target),
+        metric_provided=bool(metric),
+        interval=escape_label(interval),
+        aggregation=escape_label(aggregation),
+        timestamp=int(time.time())
+    )
+    return Response(content=error_response.encode(), media_type=METRICS_MEDIA_TYPE)
+
+@app.get(AZURE_METRICS_PATH, response_class=Response)
 async def azure_metrics(
-    subscription: Optional[str] = Query(None, description="Azure subscription ID"),
-    target: Optional[str] = Query(None, description="Azure resource target path"), 
-    metric: Optional[str] = Query(None, description="Comma-separated metric names"),
+    params: AzureParams = Depends(require_azure_params),
     interval: Optional[str] = Query("PT1M", description="Time interval (e.g., PT1M, PT5M)"),
     aggregation: Optional[str] = Query("average", description="Aggregation method"),
     name: Optional[str] = Query(None, description="Custom metric name"),
@@ -174,26 +146,14 @@ async def azure_metrics(
     Azure-style metrics endpoint that requires URL parameters
     Simulates the behavior described in the PRD
     """
+    subscription, target, metric = params
     
-    # Log the request for debugging
-    print(f"Request received - subscription: {subscription}, target: {target}, metric: {metric}, interval: {interval}, aggregation: {aggregation}")
-    
-    # Return error if required parameters are missing
-    if not subscription or not target or not metric:
-        error_timestamp = int(time.time())
-        error_response = f"""# HELP azure_exporter_error Error in Azure exporter
-# TYPE azure_exporter_error gauge
-azure_exporter_error{{reason="missing_required_parameters",subscription="{subscription or 'missing'}",target_provided="{bool(target)}",metric_provided="{bool(metric)}"}} 1 {error_timestamp}
-
-# HELP azure_exporter_request_info Information about the request
-# TYPE azure_exporter_request_info gauge  
-azure_exporter_request_info{{subscription="{subscription or 'none'}",has_target="{bool(target)}",has_metric="{bool(metric)}",interval="{interval}",aggregation="{aggregation}"}} 0 {error_timestamp}
-"""
-        return error_response
+    log_azure_request(subscription, target, metric, interval, aggregation)
     
-    return generate_prometheus_metrics(subscription, target, metric, interval, aggregation)
+    body = render_metrics(subscription, target, metric, interval, aggregation)
+    return Response(content=body, media_type=METRICS_MEDIA_TYPE)
 
-@app.get("/debug/params")
+@app.get("/debug/params", response_class=Response)
 async def debug_params(
     subscription: Optional[str] = Query(None),
     target: Optional[str] = Query(None),
@@ -202,7 +162,7 @@ async def debug_params(
     aggregation: Optional[str] = Query(None)
 ):
     """Debug endpoint to see what parameters were received"""
-    return {
+    payload = {
         "received_parameters": {
             "subscription": subscription,
             "target": target, 
@@ -210,10 +170,12 @@ async def debug_params(
             "interval": interval,
             "aggregation": aggregation
         },
-        "parameter_count": sum(1 for p in [subscription, target, metric, interval, aggregation] if p is not None),
-        "required_params_present": all([subscription, target, metric]),
+        "parameter_count": ((subscription is not None) + (target is not None) + (metric is not None)
+                            + (interval is not None) + (aggregation is not None)),
+        "required_params_present": bool(subscription) and bool(target) and bool(metric),
         "timestamp": int(time.time())
     }
+    return Response(content=orjson.dumps(payload), media_type="application/json")
 
 if __name__ == "__main__":
     print("Starting OpenAgent Test Metrics Server (FastAPI)")
@@ -236,5 +198,9 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=9090,
         reload=False,
-        log_level="info"
+        loop="uvloop",
+        http="httptools",
+        workers=os.cpu_count(),
+        log_level="warning",
+        access_log=False
     )
\ No newline at end of file
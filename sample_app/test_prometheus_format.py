@@ -0,0 +1,41 @@
+import prometheus_format
+from prometheus_format import cached_static_sections, render_metrics
+
+
+TARGET = "/subscriptions/x/providers/Microsoft.Sql/managedInstances/y"
+
+
+def test_small_parameter_set_is_cached():
+    cached_static_sections.cache_clear()
+    render_metrics("sub", TARGET, "avg_cpu_percent,virtual_core_count", "PT1M", "average")
+    assert cached_static_sections.cache_info().currsize == 1
+
+
+def test_oversized_interval_bypasses_cache():
+    cached_static_sections.cache_clear()
+    interval = "P" * (prometheus_format.MAX_CACHED_PARAM_LEN + 1)
+    body = render_metrics("sub", TARGET, "avg_cpu_percent", interval, "average")
+    assert cached_static_sections.cache_info().currsize == 0
+    assert b"azure_sql_avg_cpu_percent" in body
+
+
+def test_oversized_aggregation_bypasses_cache():
+    cached_static_sections.cache_clear()
+    aggregation = "a" * (prometheus_format.MAX_CACHED_PARAM_LEN + 1)
+    render_metrics("sub", TARGET, "avg_cpu_percent", "PT1M", aggregation)
+    assert cached_static_sections.cache_info().currsize == 0
+
+
+def test_long_metric_list_bypasses_cache():
+    cached_static_sections.cache_clear()
+    metric = ",".join(["a"] * (prometheus_format.MAX_CACHED_METRICS + 1))
+    body = render_metrics("sub", TARGET, metric, "PT1M", "average")
+    assert cached_static_sections.cache_info().currsize == 0
+    assert body.count(b"azure_unknown_metric{") == prometheus_format.MAX_CACHED_METRICS + 1
+
+
+def test_metric_name_is_escaped_in_help_and_labels():
+    body = render_metrics("sub", TARGET, 'x\ny"\\z', "PT1M", "average").decode()
+    assert '# HELP azure_unknown_metric Unknown metric x\\ny"\\\\z from Azure API\n' in body
+    assert 'metric_name="x\\ny\\"\\\\z"' in body
+    assert "\ny" not in body